@@ -1,8 +1,6 @@
 # import libraries
 import cv2
 import tkinter as tk
-from tkinter import filedialog
-from PIL import Image, ImageTk
 import numpy as np
 
 # create a GUI to upload a frame from a video and select 4 points to define a queue region
@@ -43,6 +41,8 @@ class QueueRegionSelector:
         Opens a file dialog to select a video file, displays the first frame,
         and enables the create region button.
         """
+        from tkinter import filedialog  # only needed once the button is clicked
+
         self.video_path = filedialog.askopenfilename(filetypes=[("Video files", "*.mp4;*.avi;*.mov")])
         if self.video_path:
             self.status_label.config(text=f"Video uploaded: {self.video_path}")
@@ -68,8 +68,9 @@ class QueueRegionSelector:
         # Use the original frame without resizing
         height, width = self.original_frame_size
         frame_rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame_rgb)
-        self.image_tk = ImageTk.PhotoImage(img)
+        # Hand Tk the raw RGB bytes behind a PPM header, which avoids a PIL image round-trip
+        ppm = b"P6\n%d %d\n255\n" % (width, height) + frame_rgb.tobytes()
+        self.image_tk = tk.PhotoImage(data=ppm, format="PPM")
 
         # Create scrollable canvas once
         if self.scrollable_canvas is None:
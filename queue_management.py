@@ -1,9 +1,71 @@
+import os
+import threading
+from queue import Empty, Queue
+
 import cv2
 import numpy as np
-from ultralytics import solutions
+import torch
 from ultralytics.solutions.solutions import BaseSolution, SolutionAnnotator, SolutionResults
 from ultralytics.utils.plotting import colors
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the NumPy implementation below is used without it
+    njit = None
+
+
+def _points_in_convex_numpy(points, region_pts, region_normals):
+    """Returns a boolean mask of the `points` (N, 2) on the inner side of every edge of a convex region."""
+    offsets = points[:, None, :] - region_pts[None, :, :]
+    return (np.einsum("nij,ij->ni", offsets, region_normals) >= 0).all(axis=1)
+
+
+def _points_on_border(points, region_pts):
+    """Returns a boolean mask of the `points` (N, 2) on an edge of the polygon `region_pts`, vertices included."""
+    edges = np.roll(region_pts, -1, axis=0) - region_pts
+    offsets = points[:, None, :] - region_pts[None, :, :]
+    cross = offsets[..., 0] * edges[:, 1] - offsets[..., 1] * edges[:, 0]  # zero on the line through the edge
+    along = np.einsum("nij,ij->ni", offsets, edges)  # between 0 and |edge|^2 within the edge
+    return ((cross == 0) & (along >= 0) & (along <= (edges * edges).sum(axis=1))).any(axis=1)
+
+
+def _points_in_convex_loop(points, region_pts, region_normals):
+    """Same test as `_points_in_convex_numpy` written as plain loops, which Numba compiles without temporary arrays."""
+    inside = np.ones(points.shape[0], dtype=np.bool_)
+    for n in range(points.shape[0]):
+        for i in range(region_pts.shape[0]):
+            dx, dy = points[n, 0] - region_pts[i, 0], points[n, 1] - region_pts[i, 1]
+            if dx * region_normals[i, 0] + dy * region_normals[i, 1] < 0:
+                inside[n] = False
+                break
+    return inside
+
+
+# Use the compiled loops when Numba is installed, cache=True keeps the compiled code between runs
+points_in_convex = _points_in_convex_numpy if njit is None else njit(cache=True)(_points_in_convex_loop)
+
+
+class QueueAnnotator(SolutionAnnotator):
+    """SolutionAnnotator that can be pointed at a new frame, so QueueManager reuses one instance for a whole video."""
+
+    def reset(self, im0):
+        """
+        Draws on `im0` from now on, keeping the line width and font settings computed for the first frame.
+
+        `im0` is prepared like an ndarray image on the cv2 path of Annotator.__init__: grayscale is expanded to BGR,
+        2-channel images are zero-padded, extra channels are dropped, and the image must be contiguous.
+        """
+        if im0.shape[2] == 1:  # handle grayscale
+            im0 = cv2.cvtColor(im0, cv2.COLOR_GRAY2BGR)
+        elif im0.shape[2] == 2:  # handle 2-channel images
+            im0 = np.ascontiguousarray(np.dstack((im0, np.zeros_like(im0[..., :1]))))
+        elif im0.shape[2] > 3:  # multispectral
+            im0 = np.ascontiguousarray(im0[..., :3])
+        assert im0.data.contiguous, "Image not contiguous. Apply np.ascontiguousarray(im0) to the frame."
+        self.im = im0 if im0.flags.writeable else im0.copy()  # draw on a copy of read-only frames
+        return self
+
+
 class QueueManager(BaseSolution):
     """
     Manages queue counting in real-time video streams based on object tracks.
@@ -17,6 +79,8 @@ class QueueManager(BaseSolution):
         region_length (int): The number of points defining the queue region.
         track_line (List[Tuple[int, int]]): List of track line coordinates.
         track_history (Dict[int, List[Tuple[int, int]]]): Dictionary storing tracking history for each object.
+        infer_size (Tuple[int, int] | None): (width, height) frames are resized to before inference, None to use the
+            original frames. Detections are scaled back to the original frame size.
 
     Methods:
         initialize_region: Initializes the queue region.
@@ -37,13 +101,75 @@ class QueueManager(BaseSolution):
 
     def __init__(self, **kwargs):
         """Initializes the QueueManager with parameters for tracking and counting objects in a video stream."""
+        self.infer_size = kwargs.pop("infer_size", None)  # Not a BaseSolution argument
+        self._native_size = None  # Frame size the inference scale below was computed for
+        self._infer_scale = None  # Factors mapping (x1, y1, x2, y2) boxes from infer_size back to the frame
+        self._annotator = None  # Annotator reused across frames, created on the first frame
         super().__init__(**kwargs)
         self.initialize_region()
         self.counts = 0  # Queue counts information
         self.rect_color = (255, 255, 255)  # Rectangle color for visualization
         self._display_counts = True  # Flag to display counts on the video
+        self._counts_labels = {}  # Formatted count labels, keyed by count
+        self._display_region = True  # Flag to draw the queue region on the video
         self.region_length = len(self.region)  # Store region length for further usage
+        self._check_region = self.region_length >= 3  # Only polygon regions are used for counting
+
+        # The region is fixed after construction, so prepare everything needed to test points against it only once
+        self._region_poly_np = np.asarray(self.region, np.int32)
+
+        # A convex region, such as the four points picked in the GUI, is tested with one half-plane check per edge
+        self._region_pts = self._region_poly_np.astype(np.float64)
+        edges = np.roll(self._region_pts, -1, axis=0) - self._region_pts
+        next_edges = np.roll(edges, -1, axis=0)
+        turns = edges[:, 0] * next_edges[:, 1] - edges[:, 1] * next_edges[:, 0]  # cross products of adjacent edges
+        total_turn = np.arctan2(turns, (edges * next_edges).sum(axis=1)).sum()  # +-2*pi unless self-intersecting
+        self._region_is_convex = bool(
+            self._check_region and (np.all(turns > 0) or np.all(turns < 0)) and np.isclose(abs(total_turn), 2 * np.pi)
+        )
+        # Edge normals oriented towards the inside, so inner points have a non-negative dot product with every normal
+        self._region_normals = np.stack((-edges[:, 1], edges[:, 0]), axis=1) * np.sign(turns.sum())
+
+        # Other regions fall back to a matplotlib path, imported only when it is needed
+        self._region_path = None
+        if not self._region_is_convex:
+            from matplotlib.path import Path
+
+            self._region_path = Path(self._region_poly_np)
         
+    def _points_in_region(self, points):
+        """Returns a boolean mask of the `points` (N, 2) that lie inside or on the border of the queue region."""
+        if self._region_is_convex:
+            return points_in_convex(points, self._region_pts, self._region_normals)
+        # contains_points leaves points on the border out, cv2.pointPolygonTest(...) >= 0 counted them as inside
+        return self._region_path.contains_points(points) | _points_on_border(points, self._region_pts)
+
+    def _inference_frame(self, im0):
+        """Returns `im0` resized to `infer_size` for the model, or `im0` itself if it is not larger than that."""
+        height, width = im0.shape[:2]
+        if (width, height) != self._native_size:
+            self._native_size = (width, height)
+            self._infer_scale = None
+            if self.infer_size is not None and (width > self.infer_size[0] or height > self.infer_size[1]):
+                sx, sy = width / self.infer_size[0], height / self.infer_size[1]
+                self._infer_scale = torch.tensor([sx, sy, sx, sy], dtype=torch.float32)
+        if self._infer_scale is None:
+            return im0
+        return cv2.resize(im0, self.infer_size, interpolation=cv2.INTER_LINEAR)
+
+    def _as_soa(self):
+        """
+        Converts the track IDs, classes and confidences into NumPy arrays parallel to the boxes.
+
+        The boxes stay the tensor returned by the tracker, because BaseSolution.store_tracking_history needs tensor
+        rows. Frames without tracks get an empty (0, 4) tensor so they can be indexed like any other frame.
+        """
+        if not isinstance(self.boxes, torch.Tensor):
+            self.boxes = torch.zeros((0, 4), dtype=torch.float32)
+        self.track_ids = np.asarray(self.track_ids, dtype=np.int64)
+        self.clss = np.asarray(self.clss, dtype=np.int32)
+        self.confs = np.asarray(self.confs, dtype=np.float32)
+
     def hide_counts(self):
         """Hides the queue counts display."""
         self._display_counts = False
@@ -52,6 +178,14 @@ class QueueManager(BaseSolution):
         """Shows the queue counts display."""
         self._display_counts = True
 
+    def hide_region(self):
+        """Hides the queue region outline."""
+        self._display_region = False
+
+    def show_region(self):
+        """Shows the queue region outline."""
+        self._display_region = True
+
     def process(self, im0):
         """
         Process queue management for a single frame of video.
@@ -69,50 +203,55 @@ class QueueManager(BaseSolution):
             >>> results = queue_manager.process(frame)
         """
         self.counts = 0  # Reset counts every frame
-        self.extract_tracks(im0)  # Extract tracks from the current frame
-        annotator = SolutionAnnotator(im0, line_width=self.line_width)  # Initialize annotator
-        annotator.draw_region(reg_pts=self.region, color=self.rect_color, thickness=self.line_width * 2)  # Draw region
+        self.extract_tracks(self._inference_frame(im0))  # Extract tracks from the current frame
+        self._as_soa()  # Work on parallel arrays instead of per-object tuples
+        if self._infer_scale is not None:
+            self.boxes = self.boxes * self._infer_scale  # Map boxes back to the original frame, not in place
+        if self._annotator is None:
+            self._annotator = QueueAnnotator(im0, line_width=self.line_width)  # Initialize annotator
+        annotator = self._annotator.reset(im0)
+        if self._display_region:
+            annotator.draw_region(reg_pts=self.region, color=self.rect_color, thickness=self.line_width * 2)  # Draw region
         
         # Filter objects based on their position relative to the queue region
-        region_poly = np.array(self.region, np.int32)
-        filtered_data = []
-        # Iterate over all detected and tracked objects
-        for box, track_id, cls, conf in zip(self.boxes, self.track_ids, self.clss, self.confs):
-            x1, y1, x2, y2 = [int(x) for x in box]
-            
-            # Use the bottom-center point of the bounding box as the representative point for the object
-            center_x = (x1 + x2) // 2
-            center_y = (y1+y2) //2  #since is the bottom where the person feet are
-            
-            # Check if the representative point is inside the queue region polygon
-            # cv2.pointPolygonTest returns > 0 if the point is inside, 0 if on the edge, and < 0 if outside.
-            is_inside = cv2.pointPolygonTest(region_poly, (center_x, center_y), False) >= 0 
-            
-            if is_inside:
-                # Keep the data only for objects inside the region
-                filtered_data.append((box, track_id, cls, conf))
+        boxes_i = np.ascontiguousarray(self.boxes, dtype=np.int32)  # Truncate all coordinates to pixels at once
 
-        self.boxes, self.track_ids, self.clss, self.confs = zip(*filtered_data) if filtered_data else ([], [], [], [])
+        # Use the center point of each bounding box as the representative point for the object
+        centers = np.column_stack(((boxes_i[:, 0] + boxes_i[:, 2]) >> 1, (boxes_i[:, 1] + boxes_i[:, 3]) >> 1))
 
-        for box, track_id, cls, conf in zip(self.boxes, self.track_ids, self.clss, self.confs):
-            # Draw bounding box and counting region
-            annotator.box_label(box, label=self.adjust_box_label(cls, conf, track_id), color=colors(track_id, True))
-            self.store_tracking_history(track_id, box)  # Store track history
+        # Test all representative points against the queue region polygon in a single vectorized call
+        idx = np.flatnonzero(self._points_in_region(centers))
+
+        # Keep the data only for objects inside the region
+        self.boxes, self.track_ids, self.clss, self.confs = (
+            self.boxes[torch.from_numpy(idx)], self.track_ids[idx], self.clss[idx], self.confs[idx]
+        )
 
-            # Cache frequently accessed attributes
-            track_history = self.track_history.get(track_id, [])
+        # Bind frequently accessed attributes to locals once instead of looking them up per object
+        box_label = annotator.box_label
+        adjust_box_label = self.adjust_box_label
+        store_tracking_history = self.store_tracking_history
 
-            # Store previous position of track and check if the object is inside the counting region
-            prev_position = None
-            if len(track_history) > 1:
-                prev_position = track_history[-2]
-            if self.region_length >= 3 and prev_position and self.r_s.contains(self.Point(self.track_line[-1])):
-                self.counts += 1
+        for box, track_id, cls, conf in zip(self.boxes, self.track_ids, self.clss, self.confs):
+            # Draw bounding box and counting region
+            box_label(box, label=adjust_box_label(cls, conf, track_id), color=colors(track_id, True))
+            store_tracking_history(track_id, box)  # Store track history, this also updates self.track_line
+
+        # Count the objects that have a previous position and whose latest position is inside the counting region. The
+        # latest position is the box center store_tracking_history just appended, so take it from all boxes at once.
+        if self._check_region and len(self.track_ids):
+            track_history = self.track_history
+            has_previous = np.fromiter((len(track_history[t]) > 1 for t in self.track_ids), bool, len(self.track_ids))
+            boxes = np.asarray(self.boxes)
+            latest = (boxes[:, :2] + boxes[:, 2:]) / 2
+            self.counts = int((self._points_in_region(latest) & has_previous).sum())
 
         # Display queue counts
         if self._display_counts:
+            if self.counts not in self._counts_labels:
+                self._counts_labels[self.counts] = f"Queue Counts : {self.counts}"
             annotator.queue_counts_display(
-                f"Queue Counts : {str(self.counts)}",
+                self._counts_labels[self.counts],
                 points=self.region,
                 region_color=self.rect_color,
                 txt_color=(104, 31, 17),
@@ -123,18 +262,81 @@ class QueueManager(BaseSolution):
         # Return a SolutionResults object with processed data
         return SolutionResults(plot_im=plot_im, queue_count=self.counts, total_tracks=len(self.track_ids))
     
-def process_video(video_path="example_video.mp4", output_path="output.mp4"):
+def read_frames(cap, frame_queue, stop_event, sample_every=1, errors=None):
+    """
+    Decodes every `sample_every`-th frame of `cap` into `frame_queue`, followed by a None sentinel at the end.
+
+    Run on a background thread so that decoding the next frame overlaps with processing the current one. Skipped
+    frames are only grabbed, never decoded. Setting `stop_event` makes the reader exit after its current frame.
+
+    If decoding raises and `errors` is a list, the exception is appended to it instead of ending the thread with a
+    traceback, so the consumer can re-raise it once it has joined the thread.
+    """
+    try:
+        while not stop_event.is_set():
+            # grab() advances past skipped frames without the cost of decoding them
+            for _ in range(sample_every - 1):
+                if not cap.grab():
+                    break
+            success, im0 = cap.read()
+            if not success:
+                break
+            frame_queue.put(im0)
+    except Exception as e:
+        if errors is None:
+            raise
+        errors.append(e)
+    finally:
+        # Always end with the sentinel, also when decoding raises, so the consumer never waits forever
+        frame_queue.put(None)
+
+
+def write_frames(video_writer, frame_queue, errors=None):
+    """
+    Writes frames from `frame_queue` to `video_writer` until a None sentinel is received.
+
+    Run on a background thread so that encoding the output video overlaps with processing the next frame.
+
+    If writing raises and `errors` is a list, the exception is appended to it as soon as it happens. The producer can
+    check the list to stop early and re-raise the error once it has joined the thread.
+    """
+    try:
+        # Compare by identity, `frame == None` is an element-wise comparison for ndarray frames
+        while (frame := frame_queue.get()) is not None:
+            video_writer.write(frame)
+    except Exception as e:
+        if errors is not None:
+            errors.append(e)
+        # Keep taking frames up to the sentinel so the producer never blocks on a full queue
+        while frame_queue.get() is not None:
+            pass
+        if errors is None:
+            raise
+
+
+def process_video(video_path="example_video.mp4", output_path="output.mp4", preview=False):
     """
     Processes a video file to manage queue counting and alerts based on object tracking.
 
     This function opens a video file, initializes the QueueManager, and processes each frame to count objects
     in a specified queue region. It also implements congestion and dwell time alerts.
 
-    The processed video is saved to an output file and displayed in real-time.
+    The processed video is saved to an output file and, when `preview` is True, displayed in real-time.
+
+    Args:
+        video_path (str): Path to the input video file.
+        output_path (str | None): Path of the annotated output video, None to skip writing it.
+        preview (bool): Show every PREVIEW_EVERY-th processed frame in a window, press 'q' to stop early.
 
     Examples:
         >>> process_video()
+        >>> process_video(preview=True)
     """
+    # OpenCV's worker pool competes with PyTorch inference for the same cores. Capping it at half the cores keeps both
+    # from oversubscribing the CPU, at the cost of slower cv2 calls (decoding, resize, drawing) on large frames.
+    cv2.setNumThreads(max(1, (os.cpu_count() or 2) // 2))
+    cv2.setUseOptimized(True)  # make sure the SIMD-optimized code paths are enabled
+
     # open video
     cap = cv2.VideoCapture(video_path) 
     assert cap.isOpened(), "Error opening video file"
@@ -142,92 +344,154 @@ def process_video(video_path="example_video.mp4", output_path="output.mp4"):
     # video properties
     w,h, fps = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), cap.get(cv2.CAP_PROP_FPS)
 
+    # analyze only about TARGET_FPS frames per second, skipping the rest without decoding them
+    TARGET_FPS = 10
+    SAMPLE_EVERY = max(1, int(round(fps / TARGET_FPS)))
+    analyzed_fps = fps / SAMPLE_EVERY
+
+    # run the model on frames at most INFER_WIDTH pixels wide, the overlays are still drawn at full resolution
+    INFER_WIDTH = 640
+    infer_size = (INFER_WIDTH, max(1, round(INFER_WIDTH * h / w))) if w > INFER_WIDTH else None
+
     # queue region from qui
     queue_region =  [(217, 288), (342, 436), (562, 225), (455, 147)]
 
+    # show only one in PREVIEW_EVERY frames in the preview window to keep GUI work off the hot path
+    PREVIEW_EVERY = 3
+
     # video writer
-    video_writer = cv2.VideoWriter(output_path,cv2.VideoWriter_fourcc(*"mp4v"),fps,(w,h))
+    video_writer = None
+    write_errors = []  # an encoding error of the writer thread, raised here once the thread is joined
+    if output_path is not None:
+        video_writer = cv2.VideoWriter(output_path,cv2.VideoWriter_fourcc(*"mp4v"),analyzed_fps,(w,h))
+
+        # encode on a background thread, the bounded queue limits how many frames wait in memory
+        write_queue = Queue(maxsize=8)
+        writer_thread = threading.Thread(
+            target=write_frames, args=(video_writer, write_queue, write_errors), daemon=True
+        )
+        writer_thread.start()
 
     # use here the QueueManager class from code modified from above
     queue = QueueManager(
         model="yolo11n.pt", 
         classes_names = ["person"],
         region=queue_region,
+        infer_size=infer_size,
     )
 
     # hide the text box count on each frame 
     queue.hide_counts()
 
+    # nobody sees the region outline when the frames are neither previewed nor written
+    if not preview and video_writer is None:
+        queue.hide_region()
+
     # congestion alert parameters
     CONGESTION_THRESHOLD = 3 
     ALERT_MESSAGE = "❗️ CONGESTION ALERT! Queue too long."
 
+    # format the overlay texts once and reuse them while the count or the waiting person stays the same
+    queue_count_messages = {}  # queue count -> message
+    dwell_alert_messages = {}  # track id -> message
+
     # person stands over 5 seconds logic
     person_dwell_times = {} 
     frame_number = 0 
     DWELL_TIME_SECONDS = 5
-    fps = cap.get(cv2.CAP_PROP_FPS) # Ensure fps is correct
-    DWELL_TIME_FRAMES = int(DWELL_TIME_SECONDS * fps)
-
-    while cap.isOpened():
-        success, im0 = cap.read()
-        if not success:
-            break
-        
-        results = queue.process(im0)
-        
-        #extract the annotated frame from the SolutionResults object, this is the numpy array of the processed frame
-        annotated_frame = results.plot_im
-        
-        current_person_ids = set()
-
-        # These IDs represent people currently detected inside the queue region.
-        for track_id in queue.track_ids: 
-            current_person_ids.add(track_id)
+    DWELL_TIME_FRAMES = int(DWELL_TIME_SECONDS * analyzed_fps) # frame_number counts analyzed frames only
+
+    # decode ahead on a background thread, the bounded queue holds the reader back when processing is slower
+    read_queue = Queue(maxsize=4)
+    stop_reading = threading.Event()
+    read_errors = []  # a decoding error of the reader thread, raised here once the thread is joined
+    reader_thread = threading.Thread(
+        target=read_frames, args=(cap, read_queue, stop_reading, SAMPLE_EVERY, read_errors), daemon=True
+    )
+    reader_thread.start()
+
+    # the cleanup in finally also runs if processing a frame raises, so the threads never outlive the capture
+    try:
+        while True:
+            im0 = read_queue.get()
+            if im0 is None:
+                break
+            
+            results = queue.process(im0)
+            
+            #extract the annotated frame from the SolutionResults object, this is the numpy array of the processed frame
+            annotated_frame = results.plot_im
+            
+            # These IDs represent people currently detected inside the queue region.
+            current_person_ids = set(queue.track_ids)
 
-            # Update/Add person's start frame if they are new to the queue
-            if track_id not in person_dwell_times:
-                person_dwell_times[track_id] = frame_number
+            for track_id in queue.track_ids: 
+                # Update/Add person's start frame if they are new to the queue
+                if track_id not in person_dwell_times:
+                    person_dwell_times[track_id] = frame_number
 
-            # Check for DWELL TIME ALERT
-            if (frame_number - person_dwell_times[track_id]) >= DWELL_TIME_FRAMES:
-                DWELL_ALERT_MESSAGE = f"TIME ALERT: Person {track_id} is waiting too long!"
-                cv2.putText(annotated_frame, DWELL_ALERT_MESSAGE, (10, 130), cv2.FONT_HERSHEY_DUPLEX, 0.5, (255, 0, 255), 2)
+                # Check for DWELL TIME ALERT
+                if (frame_number - person_dwell_times[track_id]) >= DWELL_TIME_FRAMES:
+                    if track_id not in dwell_alert_messages:
+                        dwell_alert_messages[track_id] = f"TIME ALERT: Person {track_id} is waiting too long!"
+                    DWELL_ALERT_MESSAGE = dwell_alert_messages[track_id]
+                    cv2.putText(annotated_frame, DWELL_ALERT_MESSAGE, (10, 130), cv2.FONT_HERSHEY_DUPLEX, 0.5, (255, 0, 255), 2)
 
 
-        # Remove IDs that have left the region/frame
-        all_known_ids = list(person_dwell_times.keys())
-        for track_id in all_known_ids:
-            if track_id not in current_person_ids:
+            # Remove IDs that have left the region/frame
+            for track_id in person_dwell_times.keys() - current_person_ids:
                 del person_dwell_times[track_id]
+                dwell_alert_messages.pop(track_id, None)
 
-        frame_number += 1
+            frame_number += 1
 
-        if annotated_frame is not None and isinstance(annotated_frame, np.ndarray):
             queue_count = results.queue_count
-            cv2.putText(annotated_frame, f"Queue Count: {queue_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            if queue_count not in queue_count_messages:
+                queue_count_messages[queue_count] = f"Queue Count: {queue_count}"
+            cv2.putText(annotated_frame, queue_count_messages[queue_count], (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
             # CONGESTION ALERT LOGIC
             if queue_count > CONGESTION_THRESHOLD:
                 # Display the alert in red
                 cv2.putText(annotated_frame, ALERT_MESSAGE, (10, 80), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 0, 255), 2)
 
-            video_writer.write(annotated_frame)
+            if video_writer is not None:
+                # the output is broken once a write failed, so stop instead of processing the rest of the video
+                if write_errors:
+                    break
+                write_queue.put(annotated_frame)
 
             #Display the processed video in real-time
-            cv2.imshow("Processed Video", annotated_frame)
-            
-        else:
-            print("Error: Annotated frame not found in results or is not a valid NumPy array.")
-            break
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-        
-
-    cap.release()
-    video_writer.release()
-    cv2.destroyAllWindows()
+            if preview and frame_number % PREVIEW_EVERY == 0:
+                cv2.imshow("Processed Video", annotated_frame)
+
+                # pollKey() pumps GUI events without the mandatory wait of waitKey(1)
+                if cv2.pollKey() & 0xFF == ord('q'):
+                    break
+
+    finally:
+        # stop the reader, draining the queue once unblocks it if it is waiting to put a frame
+        stop_reading.set()
+        try:
+            while True:
+                read_queue.get_nowait()
+        except Empty:
+            pass
+        reader_thread.join()
+
+        # flush the remaining frames before closing the output file
+        if video_writer is not None:
+            write_queue.put(None)
+            writer_thread.join()
+            video_writer.release()
+
+        cap.release()
+        cv2.destroyAllWindows()
+
+    # an error on a helper thread ends it like the end of the video would, so raise it now that both are joined
+    for errors in (read_errors, write_errors):
+        if errors:
+            raise errors[0]
     
 if __name__ == "__main__":
     process_video()
\ No newline at end of file
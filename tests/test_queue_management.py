@@ -0,0 +1,275 @@
+import threading
+from queue import Queue
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+pytest.importorskip("shapely")
+
+import torch  # noqa: E402
+import ultralytics.solutions.solutions as solutions  # noqa: E402
+from ultralytics.solutions.solutions import SolutionAnnotator  # noqa: E402
+
+from queue_management import (  # noqa: E402
+    QueueAnnotator,
+    QueueManager,
+    _points_in_convex_loop,
+    _points_in_convex_numpy,
+    points_in_convex,
+    read_frames,
+    write_frames,
+)
+
+QUEUE_REGION = [(217, 288), (342, 436), (562, 225), (455, 147)]
+
+
+def border_points(region):
+    """Returns every integer point on the edges of `region`, the vertices included."""
+    points = []
+    for (x1, y1), (x2, y2) in zip(region, region[1:] + region[:1]):
+        steps = np.gcd(abs(x2 - x1), abs(y2 - y1))
+        points += [(x1 + (x2 - x1) // steps * k, y1 + (y2 - y1) // steps * k) for k in range(steps)]
+    return np.array(points)
+
+
+class FakeYOLO:
+    """Stands in for the YOLO model, so no weights are needed."""
+
+    def __init__(self, *args, **kwargs):
+        self.names = {0: "person"}
+
+
+def fake_extract_tracks(self, im0):
+    """Returns two tracks inside and one outside QUEUE_REGION as tensors, like BaseSolution.extract_tracks."""
+    self.boxes = torch.tensor([[360.0, 260.0, 420.0, 320.0], [10.0, 10.0, 50.0, 50.0], [340.0, 240.0, 400.0, 300.0]])
+    self.clss, self.track_ids, self.confs = [0, 0, 0], [1, 2, 3], [0.9, 0.8, 0.7]
+
+
+class FailingCapture:
+    """Stands in for cv2.VideoCapture and raises while decoding the third frame."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def grab(self):
+        return True
+
+    def read(self):
+        self.reads += 1
+        if self.reads == 3:
+            raise RuntimeError("decoder error")
+        return True, np.zeros((48, 64, 3), np.uint8)
+
+
+class FailingWriter:
+    """Stands in for cv2.VideoWriter and raises on every write."""
+
+    def write(self, frame):
+        raise RuntimeError("encoder error")
+
+
+@pytest.fixture
+def make_queue_manager(monkeypatch):
+    monkeypatch.setattr(solutions, "YOLO", FakeYOLO)
+    monkeypatch.setattr(solutions.BaseSolution, "extract_tracks", fake_extract_tracks)
+    return lambda region=QUEUE_REGION, **kwargs: QueueManager(model="fake.pt", region=region, **kwargs)
+
+
+@pytest.fixture
+def queue_manager(make_queue_manager):
+    return make_queue_manager()
+
+
+class ListWriter:
+    """Stands in for cv2.VideoWriter and keeps every written frame."""
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+
+def test_write_frames_writes_ndarray_frames_until_sentinel():
+    """Real frames are written in order and the None sentinel stops the writer thread."""
+    frames = [np.full((48, 64, 3), i, np.uint8) for i in range(20)]
+    writer, frame_queue = ListWriter(), Queue(maxsize=8)
+    thread = threading.Thread(target=write_frames, args=(writer, frame_queue), daemon=True)
+    thread.start()
+    for frame in frames:
+        frame_queue.put(frame, timeout=5)
+    frame_queue.put(None, timeout=5)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(writer.frames) == len(frames)
+    assert all(written is frame for written, frame in zip(writer.frames, frames))
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_write_frames_keeps_draining_after_write_error():
+    """A failing writer still takes every frame up to the sentinel, so the producer never blocks on the queue."""
+    frame_queue = Queue(maxsize=2)
+    thread = threading.Thread(target=write_frames, args=(FailingWriter(), frame_queue), daemon=True)
+    thread.start()
+    for _ in range(10):
+        frame_queue.put(np.zeros((48, 64, 3), np.uint8), timeout=5)
+    frame_queue.put(None, timeout=5)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+
+
+def test_write_frames_records_write_error_before_draining():
+    """The error is visible to the producer while the writer still drains the queue up to the sentinel."""
+    frame_queue, errors = Queue(maxsize=2), []
+    thread = threading.Thread(target=write_frames, args=(FailingWriter(), frame_queue, errors), daemon=True)
+    thread.start()
+    frame_queue.put(np.zeros((48, 64, 3), np.uint8), timeout=5)
+    for _ in range(50):
+        if errors:
+            break
+        thread.join(timeout=0.1)
+    assert [str(e) for e in errors] == ["encoder error"]
+
+    for _ in range(10):
+        frame_queue.put(np.zeros((48, 64, 3), np.uint8), timeout=5)
+    frame_queue.put(None, timeout=5)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_read_frames_puts_sentinel_after_read_error():
+    """A decoder error still ends the queue with None, so the main loop stops instead of waiting forever."""
+    frame_queue = Queue(maxsize=8)
+    thread = threading.Thread(target=read_frames, args=(FailingCapture(), frame_queue, threading.Event()), daemon=True)
+    thread.start()
+    items = [frame_queue.get(timeout=5) for _ in range(3)]
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert [item is None for item in items] == [False, False, True]
+
+
+def test_read_frames_records_read_error():
+    """With an `errors` list the decoder error is kept for the consumer instead of escaping on the thread."""
+    frame_queue, errors = Queue(maxsize=8), []
+    thread = threading.Thread(
+        target=read_frames, args=(FailingCapture(), frame_queue, threading.Event(), 1, errors), daemon=True
+    )
+    thread.start()
+    items = [frame_queue.get(timeout=5) for _ in range(3)]
+    thread.join(timeout=5)
+
+    assert items[-1] is None
+    assert [str(e) for e in errors] == ["decoder error"]
+
+
+def test_process_filters_and_counts_tensor_boxes(queue_manager):
+    """Boxes stay tensors for store_tracking_history and only the objects inside the region are kept and counted."""
+    frame = np.zeros((480, 640, 3), np.uint8)
+    first, second = queue_manager.process(frame.copy()), queue_manager.process(frame.copy())
+
+    assert isinstance(queue_manager.boxes, torch.Tensor)
+    assert queue_manager.track_ids.tolist() == [1, 3]
+    assert (first.queue_count, first.total_tracks) == (0, 2)  # no previous positions on the first frame
+    assert (second.queue_count, second.total_tracks) == (2, 2)
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.float32])
+def test_points_in_convex_loop_matches_numpy(queue_manager, dtype):
+    """The loop version, compiled by Numba when installed, agrees with the NumPy version, borders included."""
+    rng = np.random.default_rng(0)
+    border = border_points(QUEUE_REGION)
+    points = np.concatenate((border, rng.integers(100, 600, size=(2000, 2)))).astype(dtype)
+    if dtype is np.float32:
+        points[len(border) :] += np.float32(0.5)  # also test points between pixels
+    args = (points, queue_manager._region_pts, queue_manager._region_normals)
+
+    expected = _points_in_convex_numpy(*args)
+    assert expected[: len(border)].all()  # vertices and points on the edges count as inside
+    assert 0 < expected[len(border) :].sum() < len(points) - len(border)
+    np.testing.assert_array_equal(_points_in_convex_loop(*args), expected)
+    np.testing.assert_array_equal(points_in_convex(*args), expected)
+
+
+SQUARE = [(100, 100), (300, 100), (300, 300), (100, 300)]
+REGIONS = {
+    "convex": (QUEUE_REGION, True),
+    "convex_reversed": (QUEUE_REGION[::-1], True),
+    "square": (SQUARE, True),
+    "square_reversed": (SQUARE[::-1], True),
+    "collinear": ([(100, 100), (200, 100), (300, 100), (300, 300), (100, 300)], False),
+    "concave": ([(100, 100), (300, 100), (300, 300), (200, 150), (100, 300)], False),
+    "concave_reversed": ([(100, 100), (300, 100), (300, 300), (200, 150), (100, 300)][::-1], False),
+    "bowtie": ([(100, 100), (300, 300), (300, 100), (100, 300)], False),
+    "pentagram": ([(200, 50), (290, 330), (50, 150), (350, 150), (110, 330)], False),  # every turn has the same sign
+}
+
+
+@pytest.mark.parametrize("region, convex", REGIONS.values(), ids=REGIONS.keys())
+def test_region_convexity_and_parity_with_point_polygon_test(make_queue_manager, region, convex):
+    """Only simple convex regions take the half-plane path, and every region agrees with pointPolygonTest >= 0."""
+    queue = make_queue_manager(region)
+    assert queue._region_is_convex is convex
+
+    rng = np.random.default_rng(0)
+    points = np.concatenate((border_points(region), rng.integers(0, 400, size=(3000, 2))))
+    poly = np.array(region, np.int32)
+    expected = [cv2.pointPolygonTest(poly, (int(x), int(y)), False) >= 0 for x, y in points]
+
+    np.testing.assert_array_equal(queue._points_in_region(points), expected)
+
+
+@pytest.mark.parametrize("frame_size, scale", [((1280, 960), 2), ((640, 480), None), ((400, 300), None)])
+def test_process_tracks_on_infer_size_frame_and_maps_back(make_queue_manager, monkeypatch, frame_size, scale):
+    """Larger frames are resized to infer_size for the tracker, boxes and track history come back in frame pixels."""
+    seen = []
+
+    def extract_tracks(self, im0):
+        seen.append(im0)
+        self.boxes = torch.tensor([[180.0, 130.0, 210.0, 160.0], [170.0, 120.0, 200.0, 150.0]])  # in `im0` pixels
+        self.clss, self.track_ids, self.confs = [0, 0], [1, 2], [0.9, 0.8]
+
+    monkeypatch.setattr(solutions.BaseSolution, "extract_tracks", extract_tracks)
+    queue = make_queue_manager(infer_size=(640, 480))
+    frame = np.zeros((frame_size[1], frame_size[0], 3), np.uint8)
+    queue.process(frame)
+
+    if scale is None:
+        assert seen[0] is frame  # no copy or resize for frames that already fit
+        assert queue.track_ids.size == 0  # the same boxes are outside QUEUE_REGION at this size
+    else:
+        assert seen[0].shape == (480, 640, 3)
+        assert queue.track_ids.tolist() == [1, 2]
+        expected = torch.tensor([[180.0, 130.0, 210.0, 160.0], [170.0, 120.0, 200.0, 150.0]]) * scale
+        torch.testing.assert_close(queue.boxes, expected)
+        assert queue.track_history[1][-1] == pytest.approx((195.0 * scale, 145.0 * scale))
+        assert queue.track_history[2][-1] == pytest.approx((185.0 * scale, 135.0 * scale))
+
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_queue_annotator_reset_prepares_frames_like_annotator(channels):
+    """A reused annotator draws on the same BGR image a new SolutionAnnotator would make from the frame."""
+    rng = np.random.default_rng(0)
+    annotator = QueueAnnotator(np.zeros((48, 64, 3), np.uint8), line_width=2)
+    frame = rng.integers(0, 256, size=(48, 64, channels), dtype=np.uint8)
+    frame.flags.writeable = False
+
+    annotator.reset(frame)
+
+    np.testing.assert_array_equal(annotator.im, SolutionAnnotator(frame, line_width=2).im)
+    assert annotator.im.flags.writeable and annotator.im.data.contiguous
+
+
+def test_queue_annotator_reset_rejects_non_contiguous_frames():
+    """Like Annotator.__init__, reset asks for a contiguous frame instead of drawing on a strided view."""
+    annotator = QueueAnnotator(np.zeros((48, 64, 3), np.uint8), line_width=2)
+
+    with pytest.raises(AssertionError, match="not contiguous"):
+        annotator.reset(np.zeros((48, 128, 3), np.uint8)[:, ::2])